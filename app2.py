@@ -7,6 +7,8 @@ from datetime import datetime
 import base64
 from io import BytesIO
 
+from classification import QUESTIONS, classify, is_complete, next_question
+
 class ProblemAnalyzer:
     def __init__(self):
         self.results = []
@@ -42,19 +44,16 @@ class ProblemAnalyzer:
         if not subject_input:
             return "教科名を入力してください。"
         try:
-            if correct == "正解":
-                group = 1 if hesitation == "スムーズに解けた" else 2
-            else:
-                if cause == "計算ミスやケアレスミス":
-                    group = 3 if mistake == "同じミスを繰り返している" else 4
-                elif cause == "知識不足":
-                    group = 5 if knowledge == "基本事項の暗記ミス" else 6
-                elif cause == "解法が思いつかない":
-                    group = 7 if experience == "類似問題の経験あり" else 8
-                elif cause == "問題文の理解不足":
-                    group = {"用語の意味が分からない": 9, "問題文の日本語が難しい": 10, "解答を読んでも理解できない": 11}[issue]
-                else:
-                    return "原因を選択してください。"
+            # 分類表からグループを決める（負の値は既定の選択肢で決まったグループ）
+            group = classify({
+                'correct': correct, 'hesitation': hesitation, 'cause': cause, 'mistake': mistake,
+                'knowledge': knowledge, 'experience': experience, 'issue': issue
+            })
+            if group == 0:
+                if cause == "問題文の理解不足":
+                    return "理解不足の詳細を選択してください。"
+                return "原因を選択してください。"
+            group = abs(group)
 
             # 重複問題のチェック
             comparison_result = ""
@@ -409,28 +408,9 @@ def reset_selection_states():
         if 'issue' in st.session_state:
             del st.session_state.issue
 
-def check_all_selections_made(correct):
+def check_all_selections_made(answers):
     """すべての必要な選択肢が選択されているかチェックする"""
-    if not correct:
-        return False
-    
-    if correct == "正解":
-        return 'hesitation' in st.session_state
-    elif correct == "不正解":
-        if 'cause' not in st.session_state:
-            return False
-            
-        cause = st.session_state.cause
-        if cause == "計算ミスやケアレスミス":
-            return 'mistake' in st.session_state
-        elif cause == "知識不足":
-            return 'knowledge' in st.session_state
-        elif cause == "解法が思いつかない":
-            return 'experience' in st.session_state
-        elif cause == "問題文の理解不足":
-            return 'issue' in st.session_state
-    
-    return False
+    return is_complete(answers)
 
 def main():
     st.set_page_config(page_title="学習問題分析プログラム", layout="wide")
@@ -521,52 +501,21 @@ def main():
                 problem_number = st.number_input("問題番号", min_value=1, value=st.session_state.problem_number, step=1)
                 st.session_state.problem_number = problem_number
                 
-                # 正解状況の選択
-                correct = st.radio("正解状況", ["正解", "不正解"], key="correct")
-                
-                # 正解の場合
-                if correct == "正解":
-                    hesitation = st.radio("解答プロセス", ["スムーズに解けた", "途中で手が止まった"], key="hesitation")
-                    cause, mistake, knowledge, experience, issue = None, None, None, None, None
-                
-                # 不正解の場合
-                elif correct == "不正解":
-                    hesitation = None
-                    cause = st.radio("間違いの原因", ["計算ミスやケアレスミス", "知識不足", "解法が思いつかない", "問題文の理解不足"], key="cause")
-                    
-                    # 計算ミスやケアレスミスの場合
-                    if cause == "計算ミスやケアレスミス":
-                        mistake = st.radio("計算ミスの傾向", ["初めてのミス", "同じミスを繰り返している"], key="mistake")
-                        knowledge, experience, issue = None, None, None
-                    
-                    # 知識不足の場合
-                    elif cause == "知識不足":
-                        knowledge = st.radio("知識のレベル", ["基本事項の暗記ミス", "応用知識の不足"], key="knowledge")
-                        mistake, experience, issue = None, None, None
-                    
-                    # 解法が思いつかないの場合
-                    elif cause == "解法が思いつかない":
-                        experience = st.radio("解法の経験", ["類似問題の経験あり", "全く経験がない"], key="experience")
-                        mistake, knowledge, issue = None, None, None
-                    
-                    # 問題文の理解不足の場合
-                    elif cause == "問題文の理解不足":
-                        issue = st.radio("理解不足の詳細", ["用語の意味が分からない", "問題文の日本語が難しい", "解答を読んでも理解できない"], key="issue")
-                        mistake, knowledge, experience = None, None, None
+                # 正解状況から順に、分類の木の経路上にある質問だけを表示する
+                answers = {}
+                key = next_question(answers)
+                while key is not None:
+                    label, options = QUESTIONS[key]
+                    answers[key] = st.radio(label, options, key=key)
+                    key = next_question(answers)
             
             with col2:
                 # 分析実行ボタン（条件を満たした場合は自動的に実行）
-                if st.session_state.analyzer.current_subject != "未設定" and check_all_selections_made(correct):
+                if st.session_state.analyzer.current_subject != "未設定" and check_all_selections_made(answers):
                     analysis_result = st.session_state.analyzer.analyze_problem(
                         st.session_state.analyzer.current_subject,
                         problem_number,
-                        correct,
-                        hesitation,
-                        cause,
-                        mistake,
-                        knowledge,
-                        experience,
-                        issue
+                        **answers
                     )
                     st.session_state.analysis_result = analysis_result
                 
@@ -0,0 +1,112 @@
+"""解答状況からグループ番号を決める分類表
+
+質問と選択肢、分類の木をデータとして1か所で定義し、回答の組み合わせを
+添字とする密な表にコンパイルする。1件の分類、列単位の分類、入力画面の
+完全性チェックはいずれもこの表を1回引くだけで済む。
+"""
+from array import array
+from itertools import product
+
+# 質問のキー -> (見出し, 選択肢)。並び順が分類表の次元の順序になる
+QUESTIONS = {
+    'correct': ("正解状況", ["正解", "不正解"]),
+    'hesitation': ("解答プロセス", ["スムーズに解けた", "途中で手が止まった"]),
+    'cause': ("間違いの原因", ["計算ミスやケアレスミス", "知識不足", "解法が思いつかない", "問題文の理解不足"]),
+    'mistake': ("計算ミスの傾向", ["初めてのミス", "同じミスを繰り返している"]),
+    'knowledge': ("知識のレベル", ["基本事項の暗記ミス", "応用知識の不足"]),
+    'experience': ("解法の経験", ["類似問題の経験あり", "全く経験がない"]),
+    'issue': ("理解不足の詳細", ["用語の意味が分からない", "問題文の日本語が難しい", "解答を読んでも理解できない"]),
+}
+
+# 分類の木。節は (質問のキー, {選択肢: 次の節 または グループ番号}, 既定の選択肢)。
+# 回答がない・選択肢にない場合は既定の選択肢に進む（既定がなければ分類できない）。
+DECISION_TREE = ('correct', {
+    "正解": ('hesitation', {"スムーズに解けた": 1, "途中で手が止まった": 2}, "途中で手が止まった"),
+    "不正解": ('cause', {
+        "計算ミスやケアレスミス": ('mistake', {"同じミスを繰り返している": 3, "初めてのミス": 4}, "初めてのミス"),
+        "知識不足": ('knowledge', {"基本事項の暗記ミス": 5, "応用知識の不足": 6}, "応用知識の不足"),
+        "解法が思いつかない": ('experience', {"類似問題の経験あり": 7, "全く経験がない": 8}, "全く経験がない"),
+        "問題文の理解不足": ('issue', {"用語の意味が分からない": 9, "問題文の日本語が難しい": 10, "解答を読んでも理解できない": 11}, None),
+    }, None),
+}, "不正解")
+
+# 選択肢の符号（0 は未回答、1以降は選択肢の順番）
+_CODES = {key: {option: i + 1 for i, option in enumerate(options)} for key, (_, options) in QUESTIONS.items()}
+# 各次元の大きさと、添字を計算するための重み
+_SHAPE = [len(options) + 1 for _, options in QUESTIONS.values()]
+_STRIDES = [1] * len(_SHAPE)
+for _i in range(len(_SHAPE) - 2, -1, -1):
+    _STRIDES[_i] = _STRIDES[_i + 1] * _SHAPE[_i + 1]
+
+
+def _walk(answers):
+    """分類の木をたどり、表に格納する値を返す
+
+    すべて回答済みの経路で決まればグループ番号、既定の選択肢を使って決まれば
+    負のグループ番号、決まらなければ0を返す。
+    """
+    node = DECISION_TREE
+    defaulted = False
+    while True:
+        key, branches, default = node
+        answer = answers.get(key)
+        if answer not in branches:
+            if default is None:
+                return 0
+            answer = default
+            defaulted = True
+        node = branches[answer]
+        if isinstance(node, int):
+            return -node if defaulted else node
+
+
+def _compile():
+    """すべての回答の組み合わせについて分類の木をたどり、密な表を作成する"""
+    options = [[None] + choices for _, choices in QUESTIONS.values()]
+    return array('b', (_walk(dict(zip(QUESTIONS, combination))) for combination in product(*options)))
+
+
+# 回答の符号の組み合わせ -> グループ番号（負は既定の選択肢を使った場合、0は分類不能）
+GROUP_TABLE = _compile()
+
+
+def encode(answers):
+    """回答の辞書を分類表の添字に変換する"""
+    return sum(_CODES[key].get(answers.get(key), 0) * stride for key, stride in zip(QUESTIONS, _STRIDES))
+
+
+def classify(answers):
+    """回答の辞書から分類表の値（グループ番号、負なら既定の選択肢を使用、0なら分類不能）を返す"""
+    return GROUP_TABLE[encode(answers)]
+
+
+def is_complete(answers):
+    """グループを決めるのに必要な質問にすべて回答しているかを返す"""
+    return classify(answers) > 0
+
+
+def classify_frame(answers):
+    """回答を列に持つDataFrameの各行について分類表の値をまとめて引く"""
+    import numpy as np
+
+    index = np.zeros(len(answers), dtype=np.int64)
+    for key, stride in zip(QUESTIONS, _STRIDES):
+        if key in answers.columns:
+            index += answers[key].map(_CODES[key]).fillna(0).to_numpy(dtype=np.int64) * stride
+    return np.frombuffer(GROUP_TABLE, dtype=np.int8)[index].astype(np.int64)
+
+
+def next_question(answers):
+    """次に回答が必要な質問のキーを返す（グループが決まっていればNone）
+
+    入力画面はこの関数で分類の木をたどり、経路上の質問だけを表示する。
+    """
+    node = DECISION_TREE
+    while True:
+        key, branches, _ = node
+        answer = answers.get(key)
+        if answer not in branches:
+            return key
+        node = branches[answer]
+        if isinstance(node, int):
+            return None
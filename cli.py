@@ -0,0 +1,85 @@
+"""学習問題分析のバッチ処理（コマンドライン版）
+
+ディレクトリ内のエクスポート済みファイル（Excel・CSV・Parquet）をまとめてインポートし、
+教科ごとの概要を集計し直して、統合したファイルを書き出す。
+Streamlitは読み込まないため、夜間のバッチ処理などから直接実行できる。
+
+使い方:
+    python cli.py 入力ディレクトリ 出力ディレクトリ [--workers N] [--format xlsx|csv|parquet] [--zip] [--snapshot ファイル]
+"""
+import argparse
+import os
+import sys
+from io import BytesIO
+
+from problem_analyzer import FILE_FORMATS, ProblemAnalyzer
+
+
+def _load_workbooks(input_dir):
+    """ディレクトリ内のExcel・CSV・Parquetファイルをファイル名順に読み込む
+
+    import_excel にはStreamlitのUploadedFileと同じく name と getvalue() を持つ
+    オブジェクトを渡すため、BytesIO にファイル名を付けて返す。
+    """
+    files = []
+    for file_name in sorted(os.listdir(input_dir)):
+        # Excelが作成する一時ファイル（~$で始まる）は読み飛ばす
+        if os.path.splitext(file_name)[1].lower().lstrip(".") not in FILE_FORMATS or file_name.startswith("~$"):
+            continue
+        with open(os.path.join(input_dir, file_name), "rb") as f:
+            uploaded_file = BytesIO(f.read())
+        uploaded_file.name = file_name
+        files.append(uploaded_file)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="エクスポート済みのファイルをまとめて取り込み、統合したファイルを書き出します。")
+    parser.add_argument("input_dir", help="インポートするファイル（.xlsx / .csv / .parquet）のあるディレクトリ")
+    parser.add_argument("output_dir", help="書き出し先のディレクトリ")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="読み込み・書き出しの並列数")
+    parser.add_argument("--policy", choices=["latest", "history"], default="latest", help="同じ問題番号の行の扱い（latest: 最後の行だけ残す, history: すべて残す）")
+    parser.add_argument("--format", choices=list(FILE_FORMATS), default="xlsx", help="書き出すファイルの形式")
+    parser.add_argument("--zip", action="store_true", help="書き出したファイルを1つのZIPファイルにまとめる")
+    parser.add_argument("--snapshot", help="統合したデータをバイナリ形式のスナップショットにも保存する")
+    args = parser.parse_args(argv)
+
+    files = _load_workbooks(args.input_dir)
+    if not files:
+        print(f"{args.input_dir} にインポートできるファイルがありません。", file=sys.stderr)
+        return 1
+
+    analyzer = ProblemAnalyzer(export_workers=args.workers, import_workers=args.workers, import_policy=args.policy)
+    print(analyzer.import_excel(files))
+    if len(analyzer.import_errors):
+        print(analyzer.import_errors.to_string(index=False), file=sys.stderr)
+
+    # 教科が1つだけの場合は、その教科を書き出し対象にする
+    subjects = [subject for subject, data in analyzer.subjects.items() if data]
+    if len(subjects) == 1:
+        analyzer.set_subject(subjects[0])
+    print(analyzer.get_subject_summary())
+
+    file_data = analyzer.save_results(args.format)
+    if isinstance(file_data, str):
+        print(file_data, file=sys.stderr)
+        return 1
+    for file_name, error in analyzer.export_errors:
+        print(f"{file_name} の書き出しに失敗しました: {error}", file=sys.stderr)
+    if args.zip:
+        file_data = [analyzer.bundle_results(file_data)]
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for file_name, data in file_data:
+        with open(os.path.join(args.output_dir, file_name), "wb") as f:
+            f.write(data)
+        print(os.path.join(args.output_dir, file_name))
+
+    if args.snapshot:
+        print(analyzer.save_snapshot(args.snapshot))
+
+    return 1 if analyzer.export_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
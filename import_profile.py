@@ -0,0 +1,92 @@
+"""アプリの起動時に読み込まれるモジュールの時間を計測する
+
+`python -X importtime` でアプリの最初の画面を描画するまでに読み込まれる
+モジュールを記録し、パッケージごとの読み込み時間を一覧にする。
+起動時に読み込んではいけないモジュールが含まれる場合や、合計時間が
+上限を超えた場合は終了コード1で終わるため、CIでの確認に使える。
+
+使い方:
+    python import_profile.py [--budget-ms 1000] [--forbid pandas numpy openpyxl] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# 最初の画面を描画するまでに実行するコード（Streamlitの実行環境なしで main() を呼ぶ）
+STARTUP_CODE = "import app; app.main()"
+
+# 起動時に読み込まず、インポート・エクスポートの時点で読み込むモジュール
+LAZY_MODULES = ["pandas", "numpy", "openpyxl", "pyarrow"]
+
+
+def profile_imports(code=STARTUP_CODE):
+    """code を新しいプロセスで実行し、{モジュール名: (自身の時間, 累積時間)}（マイクロ秒）を返す"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr)
+
+    timings = {}
+    for line in completed.stderr.splitlines():
+        # 形式: "import time: 自身 | 累積 | モジュール名"（先頭の空白は入れ子の深さ）
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # 見出し行
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def summarize(timings):
+    """モジュールごとの時間をトップレベルのパッケージごとに合計し、時間の長い順に返す"""
+    packages = {}
+    for name, (self_us, _) in timings.items():
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="アプリの起動時に読み込まれるモジュールの時間を計測します。")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="読み込み時間の合計の上限（ミリ秒）")
+    parser.add_argument("--forbid", nargs="*", default=LAZY_MODULES, help="起動時に読み込んではいけないモジュール")
+    parser.add_argument("--top", type=int, default=20, help="一覧に表示するパッケージの数")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args(argv)
+
+    timings = profile_imports()
+    packages = summarize(timings)
+    total_ms = sum(self_us for self_us, _ in timings.values()) / 1000
+    forbidden = [name for name in args.forbid if name in timings]
+
+    if args.json:
+        print(json.dumps({
+            "total_ms": total_ms,
+            "packages": {package: self_us / 1000 for package, self_us in packages},
+            "forbidden": forbidden
+        }, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'パッケージ':<30}{'時間(ms)':>10}")
+        for package, self_us in packages[:args.top]:
+            print(f"{package:<30}{self_us / 1000:>10.1f}")
+        print(f"{'合計':<30}{total_ms:>10.1f}")
+
+    failed = False
+    if forbidden:
+        print(f"起動時に読み込まれています: {', '.join(forbidden)}", file=sys.stderr)
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"読み込み時間の合計 {total_ms:.1f}ms が上限 {args.budget_ms:.0f}ms を超えています。", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1340 @@
+"""学習問題分析の中核（Streamlitに依存しない）
+
+ProblemAnalyzer と教科ごとのレコード、Excelの読み書きをまとめたモジュール。
+Streamlitアプリ（app.py）とコマンドラインのバッチ処理（cli.py）の両方から使う。
+numpy・pandas・openpyxl は起動を速くするため、使う関数の中で読み込む。
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+import zipfile
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from functools import partial
+from itertools import compress, count, islice
+from io import BytesIO
+
+from classification import classify, classify_frame
+
+# 表示幅が2文字分になる全角文字（CJK・ハングル・全角記号など）
+_WIDE_CHARS = re.compile(r'[\u1100-\u115f\u2e80-\u303e\u3041-\u33ff\u3400-\u4dbf\u4e00-\u9fff\ua000-\ua4cf\uac00-\ud7a3\uf900-\ufaff\ufe30-\ufe4f\uff00-\uff60\uffe0-\uffe6]')
+
+
+def _display_width(text):
+    """文字列の最長行の表示幅を返す（全角文字は2文字分）"""
+    return max(len(line) + len(_WIDE_CHARS.findall(line)) for line in text.split('\n'))
+
+
+def _column_display_width(values):
+    """Seriesの各値について最長行の表示幅を求め、その最大値を返す"""
+    if values.empty:
+        return 0
+    values = values.astype(str)
+    if values.str.contains('\n', regex=False).any():
+        values = values.str.split('\n').explode()
+    widths = values.str.len() + values.str.count(_WIDE_CHARS.pattern)
+    return int(widths.max())
+
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# 書き出し・読み込みに対応する形式（拡張子 -> MIMEタイプ）
+FILE_FORMATS = {
+    "xlsx": XLSX_MIME,
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# CSVを読み書きするときの1チャンクの行数
+CSV_CHUNK_ROWS = 10000
+
+# エクスポートキャッシュの上限（全セッション合計のバイト数）
+EXPORT_CACHE_BYTES = 64 * 1024 * 1024
+# インポートキャッシュの上限（全セッション合計のバイト数）
+IMPORT_CACHE_BYTES = 64 * 1024 * 1024
+
+# 重複問題の比較コメント（(過去に得点できたか, 今回得点できたか) -> コメント）
+COMPARISON_COMMENTS = {
+    (True, True): "継続してよい学習できています",
+    (True, False): "過去にできた問題です。復習が必要なようです。",
+    (False, True): "とても良い学習ができています。自信をもって学習を継続しましょう。",
+    (False, False): "得点までもう少し、あなたの努力は確実に実っています。実力がついています。",
+}
+
+# グループ番号 -> 推奨される学習方法
+LEARNING_METHODS = {
+    1: "得意な問題のグループ\n発展問題に挑戦する\n解法を他人に説明する\n別視点の解法で解いてみる",
+    2: "確認が必要なグループ\n解答を読み直して再度解く\n類似問題を解いて定着を図る",
+    3: "計算ミスの傾向を修正\nミスのパターンを分析し、注意点をまとめる\n丁寧に計算する練習を行う",
+    4: "一時的なミス\n同じ問題を解いて再確認する\n次の問題に挑む",
+    5: "基礎知識の再暗記\\n暗記カードやノートを使用して基本事項を再暗記する\n毎日繰り返し復習する",
+    6: "応用知識の補強\n教科書や参考書の該当範囲を復習する\n応用問題に取り組み理解を深める",
+    7: "応用力の強化\n類似問題を複数解いて応用力を養う\n解法のパターンを整理し、ほかの問題に応用する",
+    8: "基礎からのやり直し\n基礎的な問題からやり直し、理解を固める\n解説を読み基本を確認する",
+    9: "用語知識の補強\n用語集や辞書を使って用語の意味を確認する\nまとめノートを作成し,定期的に見直す",
+    10: "読解力の向上\n国語の読解問題や、要約の練習を行う\n読書の時間を確保し、読解力を高める。",
+    11: "根本的な理解の深化\n教科書や参考書を読み直す\n先生や友人に質問をして理解を深める",
+}
+
+# エクスポート時にテキストを折り返す列
+WRAP_COLUMNS = ['学習方法', 'コメント']
+
+# 学習方法の文章の表示幅（グループ番号 -> 幅。文章は変わらないため、プロセス内で共有する）
+_METHOD_WIDTHS = {}
+
+# インポートエラー一覧の列
+IMPORT_ERROR_COLUMNS = ['ファイル', '行', '列', '値', '内容']
+
+# SubjectRecords.version の採番（教科をまたいで一意）
+_VERSIONS = count(1)
+
+# 辞書のキー・値として保持する整数オブジェクト1個のサイズ（memory_usage 用）
+_INT_BYTES = sys.getsizeof(1 << 20)
+
+
+def _error_frame(file_name=None, rows=None, column=None, values=None, message=None):
+    """インポートエラーの一覧（ファイル・行・列・値・内容）をDataFrameで作成する
+
+    引数を省略すると空の一覧を返す。rows と values には同じ長さの配列を渡し、
+    rows が None の場合はファイル全体に対する1件のエラーとする。
+    """
+    import numpy as np
+    import pandas as pd
+
+    if file_name is None:
+        return pd.DataFrame(columns=IMPORT_ERROR_COLUMNS)
+    if rows is None:
+        rows, values = [None], [values]
+    return pd.DataFrame({
+        'ファイル': file_name,
+        '行': np.asarray(rows, dtype=object),
+        '列': column,
+        '値': np.asarray(values, dtype=object),
+        '内容': message
+    }, columns=IMPORT_ERROR_COLUMNS)
+
+
+def _concat_errors(frames):
+    """インポートエラーの一覧を1つにまとめる"""
+    import pandas as pd
+
+    return pd.concat(frames, ignore_index=True) if frames else _error_frame()
+
+
+class LRUCache:
+    """合計サイズに上限のあるスレッドセーフなLRUキャッシュ
+
+    上限を超えると最も長く使われていないエントリから削除する。
+    sizeof は値のサイズ（バイト数）を返す関数。
+    """
+
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict()  # キー -> (値, サイズ)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """キーに対応する値を返す（存在しない場合はNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# 書き出し済みワークブックのキャッシュ（キーは教科のバージョン）
+_EXPORT_CACHE = LRUCache(EXPORT_CACHE_BYTES)
+
+# 読み込み済みインポートファイルのキャッシュ（キーはファイル内容のSHA-256）
+_PARSED_IMPORTS = LRUCache(IMPORT_CACHE_BYTES, sizeof=lambda df: int(df.memory_usage(deep=True).sum()))
+
+
+class AttemptLog:
+    """教科のすべての解答（試行）を追記専用の型付き配列で記録する
+
+    問題番号・グループ番号・記録日時は array に追記し、コメントは空でないものだけを
+    試行番号をキーとする辞書に持つ。表示・集計に使う問題番号ごとの最新の行は
+    SubjectRecords が置き換えのたびに更新して持つため、記録を再生して作り直すことはしない。
+    1問の履歴を引くための索引（問題番号で安定ソートした試行番号の配列）は attempts() を
+    初めて呼んだときに作る。索引を作った後に追記した試行は末尾だけを走査し、その件数が
+    INDEX_TAIL 件と索引の件数の 1/8 のいずれよりも多くなったら索引を作り直す。
+    """
+
+    # 索引に含めずに走査する末尾の試行の最小件数
+    INDEX_TAIL = 1024
+
+    def __init__(self):
+        self._problem_numbers = array('q')
+        self._groups = array('b')
+        self._recorded_at = array('d')  # UNIX時間（秒）
+        self._comments = {}  # 試行番号 -> コメント（空でないもののみ）
+        self._comment_bytes = 0  # コメントの文字列の合計サイズ（memory_usage 用）
+        self._index_keys = None  # 問題番号（昇順。attempts() を呼ぶまでは None）
+        self._index_slots = None  # _index_keys と同じ順の試行番号（同じ問題番号の中では古い順）
+        self._indexed = 0  # 索引に含めた試行の件数
+
+    def __len__(self):
+        return len(self._groups)
+
+    def _build_index(self):
+        """すべての試行の問題番号を安定ソートして索引を作り直す"""
+        import numpy as np
+
+        # array を直接 frombuffer で参照すると追記できなくなるため、コピーから作る
+        problem_numbers = np.frombuffer(self._problem_numbers.tobytes(), dtype=np.int64)
+        order = np.argsort(problem_numbers, kind='stable')
+        self._index_keys = problem_numbers[order]
+        self._index_slots = order.astype(np.int32)
+        self._indexed = len(problem_numbers)
+
+    def append(self, problem_number, group, comment="", recorded_at=None):
+        """試行を1件追記する"""
+        if comment:
+            self._comments[len(self._groups)] = comment
+            self._comment_bytes += sys.getsizeof(comment)
+        self._problem_numbers.append(int(problem_number))
+        self._groups.append(int(group))
+        self._recorded_at.append(time.time() if recorded_at is None else recorded_at)
+
+    def extend(self, problem_numbers, groups, comments, recorded_at=None):
+        """列ごとの試行をまとめて追記する（記録日時は全件共通）"""
+        import numpy as np
+
+        problem_numbers = np.asarray(problem_numbers, dtype=np.int64)
+        comments = np.asarray(comments, dtype=object)
+        start = len(self._groups)
+        for offset in np.flatnonzero(comments != ""):
+            self._comments[start + int(offset)] = comments[offset]
+            self._comment_bytes += sys.getsizeof(comments[offset])
+        self._problem_numbers.frombytes(problem_numbers.tobytes())
+        self._groups.frombytes(np.asarray(groups, dtype=np.int8).tobytes())
+        self._recorded_at.frombytes(np.full(len(problem_numbers), time.time() if recorded_at is None else recorded_at).tobytes())
+
+    @classmethod
+    def from_columns(cls, problem_numbers, groups, recorded_at, comments):
+        """columns() と同じ形の配列から記録を復元する（配列はそのまま引き継ぐ）"""
+        log = cls()
+        log._problem_numbers = problem_numbers
+        log._groups = groups
+        log._recorded_at = recorded_at
+        log._comments = comments
+        log._comment_bytes = sum(sys.getsizeof(comment) for comment in comments.values())
+        return log
+
+    def columns(self):
+        """(問題番号の array, グループ番号の array, 記録日時の array, {試行番号: コメント}) を返す"""
+        return self._problem_numbers, self._groups, self._recorded_at, self._comments
+
+    def rows(self, start=0):
+        """start 件目以降の試行を (問題番号, グループ番号, コメント, 記録日時) のタプルで返す"""
+        return [(self._problem_numbers[slot], self._groups[slot], self._comments.get(slot, ""), self._recorded_at[slot])
+                for slot in range(start, len(self._groups))]
+
+    def memory_usage(self):
+        """おおよそのメモリ使用量（バイト数）を返す（コメントは追記のたびに合計したサイズを使う）"""
+        usage = (sys.getsizeof(self._problem_numbers) + sys.getsizeof(self._groups) + sys.getsizeof(self._recorded_at)
+                 + sys.getsizeof(self._comments) + len(self._comments) * _INT_BYTES + self._comment_bytes)
+        if self._index_keys is not None:
+            usage += self._index_keys.nbytes + self._index_slots.nbytes
+        return usage
+
+    def attempts(self, problem_number):
+        """問題番号のすべての試行を古い順に返す"""
+        problem_number = int(problem_number)
+        if self._index_keys is None or len(self._groups) - self._indexed > max(self.INDEX_TAIL, self._indexed // 8):
+            self._build_index()
+        start = self._index_keys.searchsorted(problem_number, 'left')
+        end = self._index_keys.searchsorted(problem_number, 'right')
+        slots = self._index_slots[start:end].tolist()
+        slots += [slot for slot in range(self._indexed, len(self._groups)) if self._problem_numbers[slot] == problem_number]
+        return [{
+            '問題番号': problem_number,
+            'グループ番号': self._groups[slot],
+            'コメント': self._comments.get(slot, ""),
+            '日時': datetime.fromtimestamp(self._recorded_at[slot])
+        } for slot in slots]
+
+
+class SubjectRecords:
+    """教科ごとの分析レコードを列指向の型付き配列で保持する
+
+    問題番号とグループ番号は array に格納し、コメントは空でないものだけを
+    スロット番号をキーとする辞書に持つ。学習方法の文章はグループ番号から
+    エクスポート・表示の時点で解決するため、レコードごとには保持しない。
+    問題番号から最新スロットを引ける索引により、検索と置換はいずれも O(1)。
+    置換で空いたスロットはグループ番号0の墓標として残し、一定量たまったら詰め直す。
+    グループ番号ごとの件数も追加・削除のたびに更新し、得点率の計算に使う。
+    version は変更のたびに全体で一意な値に更新され、エクスポートのキャッシュキーになる。
+    追加した行はすべて history（AttemptLog）にも試行として記録し、置き換えで消えた
+    過去の解答もたどれるようにする。ストレージに保存した試行は、保存のたびに history から外す。
+    """
+
+    # 墓標がこの数を超え、かつ有効行より多くなったら詰め直す
+    COMPACT_THRESHOLD = 64
+
+    def __init__(self, subject):
+        self.subject = sys.intern(str(subject))
+        self._problem_numbers = array('q')
+        self._groups = array('b')  # 0 は削除済みスロット
+        self._comments = {}  # スロット -> コメント（空でないもののみ）
+        self._comment_bytes = 0  # コメントの文字列の合計サイズ（memory_usage 用）
+        self._index = {}  # 問題番号 -> スロット
+        self._group_counts = [0] * 128  # グループ番号 -> 件数
+        self._live = 0
+        self.history = AttemptLog()  # すべての試行の記録
+        self.version = next(_VERSIONS)
+
+    @classmethod
+    def from_columns(cls, subject, problem_numbers, groups, comments, history=None):
+        """columns() と同じ形の配列からインスタンスを作る（配列はそのまま引き継ぎ、索引と集計だけ作り直す）"""
+        data = cls(subject)
+        data._problem_numbers = problem_numbers
+        data._groups = groups
+        data._comments = comments
+        data._comment_bytes = sum(sys.getsizeof(comment) for comment in comments.values())
+        data._index = dict(zip(problem_numbers, range(len(groups))))
+        for group, group_count in Counter(groups).items():
+            data._group_counts[group] += group_count
+        data._live = len(groups)
+        if history is not None:
+            data.history = history
+        return data
+
+    def columns(self):
+        """有効なレコードを (問題番号の array, グループ番号の array, {行番号: コメント}) で挿入順に返す
+
+        削除済みスロットが残っていれば先に詰め直す。返す配列はコピーせずに内部のものを返す。
+        """
+        if self._live < len(self._groups):
+            self._compact()
+        return self._problem_numbers, self._groups, self._comments
+
+    def __len__(self):
+        return self._live
+
+    def get(self, problem_number):
+        """問題番号に対応するレコードを返す（存在しない場合はNone）"""
+        slot = self._index.get(problem_number)
+        if slot is None:
+            return None
+        return {
+            '問題番号': self._problem_numbers[slot],
+            'グループ番号': self._groups[slot],
+            'コメント': self._comments.get(slot, ""),
+            '教科': self.subject
+        }
+
+    def append(self, problem_number, group, comment=""):
+        """レコードを末尾に追加する（同じ問題番号の既存行はそのまま残す）"""
+        problem_number = int(problem_number)
+        group = int(group)
+        if group <= 0:
+            raise ValueError(f"不正なグループ番号です: {group}")
+
+        slot = len(self._groups)
+        self._problem_numbers.append(problem_number)
+        self._groups.append(group)
+        if comment:
+            self._comments[slot] = comment
+            self._comment_bytes += sys.getsizeof(comment)
+        self._index[problem_number] = slot
+        self._group_counts[group] += 1
+        self._live += 1
+        self.history.append(problem_number, group, comment)
+        self.version = next(_VERSIONS)
+
+    def extend(self, problem_numbers, groups, comments):
+        """列ごとのデータをまとめて末尾に追加する（同じ問題番号の既存行はそのまま残す）"""
+        import numpy as np
+
+        problem_numbers = np.asarray(problem_numbers, dtype=np.int64)
+        groups = np.asarray(groups, dtype=np.int64)
+        comments = np.asarray(comments, dtype=object)
+        if len(groups) == 0:
+            return
+        if groups.min() <= 0 or groups.max() >= len(self._group_counts):
+            raise ValueError("不正なグループ番号が含まれています。")
+
+        start = len(self._groups)
+        self._problem_numbers.frombytes(problem_numbers.tobytes())
+        self._groups.frombytes(groups.astype(np.int8).tobytes())
+        for offset in np.flatnonzero(comments != ""):
+            self._comments[start + int(offset)] = comments[offset]
+            self._comment_bytes += sys.getsizeof(comments[offset])
+        # 同じ問題番号が複数ある場合は最後の行を索引に残す
+        self._index.update(zip(problem_numbers.tolist(), range(start, start + len(groups))))
+        for group, group_count in enumerate(np.bincount(groups, minlength=len(self._group_counts)).tolist()):
+            self._group_counts[group] += group_count
+        self._live += len(groups)
+        self.history.extend(problem_numbers, groups, comments)
+        self.version = next(_VERSIONS)
+
+    def merge(self, problem_numbers, groups, comments):
+        """列ごとのデータをまとめて取り込み、同じ問題番号の既存行を置き換える"""
+        import numpy as np
+
+        problem_numbers = np.asarray(problem_numbers, dtype=np.int64)
+        for problem_number in problem_numbers.tolist():
+            old_slot = self._index.pop(problem_number, None)
+            if old_slot is not None:
+                self._remove_slot(old_slot)
+        self.extend(problem_numbers, groups, comments)
+        self._compact_if_sparse()
+
+    def replace(self, problem_number, group, comment=""):
+        """同じ問題番号の既存行を取り除き、レコードを末尾に追加する"""
+        old_slot = self._index.pop(int(problem_number), None)
+        if old_slot is not None:
+            self._remove_slot(old_slot)
+        self.append(problem_number, group, comment)
+        self._compact_if_sparse()
+
+    def clear(self):
+        self._problem_numbers = array('q')
+        self._groups = array('b')
+        self._comments.clear()
+        self._comment_bytes = 0
+        self._index.clear()
+        self._group_counts = [0] * 128
+        self._live = 0
+        self.history = AttemptLog()
+        self.version = next(_VERSIONS)
+
+    def _remove_slot(self, slot):
+        self._group_counts[self._groups[slot]] -= 1
+        self._groups[slot] = 0
+        comment = self._comments.pop(slot, None)
+        if comment is not None:
+            self._comment_bytes -= sys.getsizeof(comment)
+        self._live -= 1
+
+    def _compact_if_sparse(self):
+        if self._live < len(self._groups) - self.COMPACT_THRESHOLD and len(self._groups) > 2 * self._live:
+            self._compact()
+
+    def _compact(self):
+        """削除済みスロットを取り除いて配列を詰め直す"""
+        live_slots = list(compress(range(len(self._groups)), self._groups))
+        new_slots = {old: new for new, old in enumerate(live_slots)}
+
+        self._problem_numbers = array('q', compress(self._problem_numbers, self._groups))
+        self._groups = array('b', compress(self._groups, self._groups))
+        self._comments = {new_slots[slot]: comment for slot, comment in self._comments.items()}
+        self._index = {number: new_slots[slot] for number, slot in self._index.items()}
+
+    def counts(self):
+        """(問題数, グループ1の件数, グループ2の件数) を集計カウンターから返す"""
+        return self._live, self._group_counts[1], self._group_counts[2]
+
+    def memory_usage(self):
+        """おおよそのメモリ使用量（バイト数）を返す（試行の記録を含む）
+
+        コメントのサイズは追加・削除のたびに更新した合計を使うため、件数によらず O(1)。
+        辞書はハッシュ表のほか、キー・値の整数オブジェクト（索引は問題番号とスロット、
+        コメントはスロット）の分も数える。
+        """
+        return (sys.getsizeof(self._problem_numbers) + sys.getsizeof(self._groups)
+                + sys.getsizeof(self._index) + 2 * len(self._index) * _INT_BYTES
+                + sys.getsizeof(self._comments) + len(self._comments) * _INT_BYTES + self._comment_bytes
+                + self.history.memory_usage())
+
+    def rates(self):
+        """得点率と完全解答率を集計カウンターから計算する"""
+        total_problems = self._live
+        if total_problems == 0:
+            return 0, 0
+
+        group_1_count = self._group_counts[1]
+        group_1_2_count = group_1_count + self._group_counts[2]
+
+        score_rate = (group_1_2_count / total_problems) * 100
+        perfect_rate = (group_1_count / total_problems) * 100
+
+        return score_rate, perfect_rate
+
+    def rows(self):
+        """有効なレコードを (問題番号, グループ番号, コメント) のタプルで挿入順に返す"""
+        comments = self._comments
+        return [(problem_number, group, comments.get(slot, ""))
+                for slot, (problem_number, group) in enumerate(zip(self._problem_numbers, self._groups)) if group]
+
+    def groups_of(self, problem_numbers):
+        """問題番号の配列に対応するグループ番号を返す（データのない問題はNaN）"""
+        import numpy as np
+        import pandas as pd
+
+        slots = pd.Series(np.asarray(problem_numbers, dtype=np.int64)).map(self._index)
+        found = slots.notna().to_numpy()
+        groups = np.full(len(slots), np.nan)
+        groups[found] = np.array(self._groups, dtype=np.int64)[slots[found].astype('int64')]
+        return groups
+
+    def to_frame(self, methods):
+        """エクスポート・表示用のDataFrameを挿入順で作成する
+
+        methods はグループ番号から学習方法の文章を引く辞書。
+        """
+        import numpy as np
+        import pandas as pd
+
+        groups = np.array(self._groups, dtype=np.int64)
+        live = np.flatnonzero(groups)
+
+        comments = np.full(len(groups), "", dtype=object)
+        for slot, comment in self._comments.items():
+            comments[slot] = comment
+
+        live_groups = pd.Series(groups[live])
+        return pd.DataFrame({
+            '問題番号': np.array(self._problem_numbers, dtype=np.int64)[live],
+            'グループ番号': live_groups,
+            '学習方法': live_groups.map(methods),
+            'コメント': comments[live],
+            '教科': self.subject
+        })
+
+
+class ProblemAnalyzer:
+    """問題ごとの解答状況をグループに分類し、教科ごとに記録する
+
+    storage を渡すと、教科のデータは set_subject で選んだ時点でストレージから読み込み、
+    記録・インポート・消去のたびに変更のあった教科をまとめて保存する
+    （ストレージのインターフェースは storage.py を参照）。
+    さらに memory_budget（バイト数）を渡すと、メモリ上の教科データの合計がこれを
+    超えたときに、現在の教科以外で最近使っていない教科から解放する。解放した教科は
+    次に選ばれたときにストレージから読み直し、教科概要はストレージの集計値から作る。
+    """
+
+    def __init__(self, export_workers=1, export_executor="process", import_workers=1, import_executor="process", import_policy="latest", storage=None, memory_budget=None):
+        self.results = SubjectRecords("未設定")
+        self.subjects = {}  # 教科ごとのデータフレームを管理
+        self.current_subject = "未設定"  # 現在の教科
+        self.groups = LEARNING_METHODS
+        # エクスポートの並列数と実行方式（"process" または "thread"）
+        self.export_workers = export_workers
+        self.export_executor = export_executor
+        self.export_errors = []  # 直近のエクスポートで失敗したファイル
+        # インポートの並列数と実行方式
+        self.import_workers = import_workers
+        self.import_executor = import_executor
+        # インポート済みファイルの内容ハッシュ
+        self._imported_digests = set()
+        # 同じ問題番号の行の扱い（"latest": 最後の行で置き換える、"history": すべての行を残す）
+        self.import_policy = import_policy
+        # 直近のインポートで取り込めなかったファイル・行（インポート前はNone。pandasを読み込まないため）
+        self.import_errors = None
+        # 教科概要のテキスト（(データのバージョン, テキスト)）
+        self._summary = None
+        # 教科データの保存先（Noneの場合はメモリ上だけに保持する）
+        self.storage = storage
+        # メモリ上に保持する教科データの上限（バイト数、Noneなら解放しない）
+        self.memory_budget = memory_budget
+        # 教科を使った順（古い順。メモリ上限を超えたときに古いものから解放する）
+        self._recent_subjects = OrderedDict()
+
+    def set_subject(self, subject_name):
+        if subject_name and subject_name != "":
+            subject_name = sys.intern(subject_name)
+            self.current_subject = subject_name
+            self.results = self._subject_records(subject_name)
+            self._evict_cold_subjects()
+            return f"教科「{subject_name}」の分析を開始します。"
+        else:
+            return "教科名を入力してください。"
+
+    def _subject_records(self, subject):
+        """教科のレコードを返す（読み込んでいなければストレージから読み込み、なければ新しく作る）"""
+        data = self.subjects.get(subject)
+        if data is None:
+            if self.storage is not None:
+                data = self.storage.load(subject)
+            if data is None:
+                data = SubjectRecords(subject)
+            self.subjects[subject] = data
+        self._recent_subjects.pop(subject, None)
+        self._recent_subjects[subject] = None
+        return data
+
+    def _load_stored_subjects(self):
+        """ストレージにある教科のうち、まだ読み込んでいないものをすべて読み込む"""
+        if self.storage is not None:
+            for subject in self.storage.subjects():
+                self._subject_records(subject)
+
+    def _persist(self):
+        """ストレージがあれば、変更のあった教科を1回のトランザクションで保存する
+
+        別のセッションで更新されていて保存できなかった教科は、メモリ上の古いデータを捨てて
+        ストレージから読み直し、エラーをそのまま送出する。
+        """
+        if self.storage is not None:
+            try:
+                self.storage.save(list(self.subjects.values()))
+            except ValueError as e:
+                stale = getattr(e, 'subjects', ())
+                for subject in stale:
+                    self.subjects.pop(subject, None)
+                if self.current_subject in stale:
+                    self.results = self._subject_records(self.current_subject)
+                raise
+            self._evict_cold_subjects()
+
+    def _evict_cold_subjects(self):
+        """メモリ上の教科データが memory_budget を超えていれば、最近使っていない教科から解放する
+
+        解放するのはストレージに保存済みの教科だけで、現在の教科は解放しない。
+        """
+        if self.storage is None or self.memory_budget is None:
+            return
+        usage = {subject: data.memory_usage() for subject, data in self.subjects.items()}
+        total = sum(usage.values())
+        for subject in list(self._recent_subjects):
+            if total <= self.memory_budget:
+                break
+            if subject == self.current_subject or subject not in self.subjects or not self.storage.is_saved(self.subjects[subject]):
+                continue
+            del self.subjects[subject]
+            del self._recent_subjects[subject]
+            total -= usage[subject]
+
+    def analyze_problem(self, subject_input, problem_number, correct, hesitation=None, cause=None, mistake=None, knowledge=None, experience=None, issue=None, comment=""):
+        if not all([problem_number, correct]):
+            return "問題番号と正解状況を選択してください。"
+        if not subject_input:
+            return "教科名を入力してください。"
+        try:
+            # 分類表からグループを決める（負の値は既定の選択肢で決まったグループ）
+            group = classify({
+                'correct': correct, 'hesitation': hesitation, 'cause': cause, 'mistake': mistake,
+                'knowledge': knowledge, 'experience': experience, 'issue': issue
+            })
+            if group == 0:
+                if cause == "問題文の理解不足":
+                    return "理解不足の詳細を選択してください。"
+                return "原因を選択してください。"
+            group = abs(group)
+
+            # 重複問題のチェック
+            comparison_result = ""
+            existing_problem = self.results.get(problem_number)
+            if existing_problem is not None:
+                old_group = existing_problem['グループ番号']
+
+                # 過去と現在の結果に基づいてコメントを生成
+                comparison_result = COMPARISON_COMMENTS[(old_group in [1, 2], group in [1, 2])]
+
+            # 古いエントリを取り除いて末尾に追加（学習方法はグループ番号から引く）
+            self.results.replace(problem_number, group, comparison_result if comparison_result else comment)
+
+            # 結果の保存と教科データの更新
+            self.subjects[self.current_subject] = self.results
+            self._persist()
+
+            # 分析結果のテキスト作成
+            result_text = f"問題番号 {problem_number} は【グループ{group}】です。\n\n推奨される学習方法:\n{self.groups[group]}"
+
+            # 得点率と完全解答率の計算
+            if self.results:
+                score_rate, perfect_rate = self.calculate_rates()
+                result_text += f"\n\n得点率: {score_rate:.1f}%\n完全解答率: {perfect_rate:.1f}%"
+
+            # 重複問題の場合、比較結果を追加
+            if comparison_result:
+                result_text += f"\n\n【重複問題の分析】\n{comparison_result}"
+            elif comment:
+                result_text += f"\n\n【コメント】\n{comment}"
+
+            return result_text
+        except Exception as e:
+            return f"分析中にエラーが発生しました: {str(e)}"
+
+    def analyze_batch(self, subject_input, answers):
+        """複数の問題の解答状況をまとめて分析する
+
+        answers は analyze_problem の引数名（problem_number, correct, hesitation, cause,
+        mistake, knowledge, experience, issue, comment）を列に持つDataFrame。
+        グループ分けと重複問題の比較は列単位でまとめて行い、結果は各行を順に
+        analyze_problem に渡した場合と同じになる。得点率の集計は最後に1回だけ更新する。
+        入力の各行について 問題番号・グループ番号・学習方法・コメント・エラー を持つ
+        DataFrameを返す（エラーのある行は教科のデータに反映しない）。
+        """
+        import numpy as np
+        import pandas as pd
+
+        if not subject_input:
+            return "教科名を入力してください。"
+        try:
+            answers = answers.reset_index(drop=True)
+            groups, errors = self._classify_answers(answers)
+            problem_numbers = pd.to_numeric(answers['problem_number'], errors='coerce').astype('Int64')
+            if 'comment' in answers.columns:
+                comments = answers['comment'].fillna("").astype(str)
+            else:
+                comments = pd.Series("", index=answers.index)
+
+            # 重複問題のチェック（同じ入力内の前の行、なければ既存のデータと比較する）
+            valid = groups > 0
+            batch = pd.DataFrame({'問題番号': problem_numbers[valid].astype('int64'), 'グループ番号': groups[valid]})
+            old_groups = batch.groupby('問題番号')['グループ番号'].shift(1)
+            old_groups = old_groups.fillna(pd.Series(self.results.groups_of(batch['問題番号']), index=batch.index))
+            new_ok = batch['グループ番号'].isin([1, 2])
+            old_ok = old_groups.isin([1, 2])
+            has_old = old_groups.notna()
+            comparison = np.select(
+                [has_old & old_ok & new_ok, has_old & old_ok, has_old & new_ok, has_old],
+                [COMPARISON_COMMENTS[(True, True)], COMPARISON_COMMENTS[(True, False)],
+                 COMPARISON_COMMENTS[(False, True)], COMPARISON_COMMENTS[(False, False)]],
+                default=""
+            )
+            batch['コメント'] = np.where(comparison != "", comparison, comments[valid])
+
+            # 問題番号ごとに最後の行だけを教科のデータに反映する
+            latest = batch.drop_duplicates('問題番号', keep='last')
+            self.results.merge(latest['問題番号'], latest['グループ番号'], latest['コメント'])
+            self.subjects[self.current_subject] = self.results
+            self._persist()
+
+            result = pd.DataFrame({
+                '問題番号': problem_numbers,
+                'グループ番号': pd.Series(groups, dtype='Int64').where(valid),
+                'コメント': "",
+                'エラー': errors
+            })
+            result['学習方法'] = result['グループ番号'].map(self.groups)
+            result.loc[valid, 'コメント'] = batch['コメント']
+            return result[['問題番号', 'グループ番号', '学習方法', 'コメント', 'エラー']]
+        except Exception as e:
+            return f"分析中にエラーが発生しました: {str(e)}"
+
+    def _classify_answers(self, answers):
+        """解答状況のDataFrameから分類表を引いてグループ番号を列単位で決める
+
+        (グループ番号の配列, エラーメッセージの配列) を返す。分類できない行の
+        グループ番号は0で、エラーメッセージにその理由が入る。
+        """
+        import numpy as np
+        import pandas as pd
+
+        groups = np.abs(classify_frame(answers))
+
+        problem_numbers = pd.to_numeric(answers['problem_number'], errors='coerce')
+        correct = answers['correct'] if 'correct' in answers.columns else pd.Series(None, index=answers.index, dtype=object)
+        cause = answers['cause'] if 'cause' in answers.columns else pd.Series(None, index=answers.index, dtype=object)
+        missing = problem_numbers.isna() | (problem_numbers < 1) | (problem_numbers % 1 != 0) | correct.isna() | (correct == "")
+        errors = np.select(
+            [missing, (groups == 0) & (cause == "問題文の理解不足"), groups == 0],
+            ["問題番号と正解状況を選択してください。", "理解不足の詳細を選択してください。", "原因を選択してください。"],
+            default=""
+        )
+        groups = np.where(missing, 0, groups)
+        return groups, errors
+
+    def calculate_rates(self):
+        """得点率と完全解答率を計算する"""
+        return self.results.rates()
+
+    def save_results(self, file_format="xlsx"):
+        """すべての教科のデータを別々のファイルとしてメモリ上に書き出す
+
+        file_format は "xlsx"（Excel）、"csv"（UTF-8のCSV）、"parquet" のいずれか。
+        どの形式でも、ファイルの分け方と各ファイルの行・列は同じになる。
+        書き出したファイルは形式と教科のバージョンをキーにキャッシュし、
+        前回から変更のない教科は再シリアライズしない。
+        キャッシュにないワークブックは export_workers が2以上なら並列に書き出す。
+        書き出しに失敗した教科は export_errors に (ファイル名, エラー) として記録し、
+        ほかの教科のファイルはそのまま返す。
+        """
+        try:
+            self.export_errors = []
+            if file_format not in FILE_FORMATS:
+                return f"対応していない保存形式です: {file_format}"
+            # ストレージにだけある教科も書き出す
+            self._load_stored_subjects()
+            if not self.subjects or all(not data for data in self.subjects.values()):
+                return "保存するデータがありません。"
+
+            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            plan = self._export_plan(timestamp, file_format)
+
+            # キャッシュにあるものはそのまま使い、残りだけを書き出す
+            rendered = [_EXPORT_CACHE.get((file_format, cache_key)) for _, cache_key, _, _ in plan]
+            pending = [i for i, excel_data in enumerate(rendered) if excel_data is None]
+            jobs = [(plan[i][2](), plan[i][3]) for i in pending]
+            outcomes = _run_jobs(_EXPORT_WRITERS[file_format], jobs, self.export_workers, self.export_executor)
+            for i, (excel_data, error) in zip(pending, outcomes):
+                if error is not None:
+                    self.export_errors.append((plan[i][0], error))
+                    continue
+                _EXPORT_CACHE.put((file_format, plan[i][1]), excel_data)
+                rendered[i] = excel_data
+
+            # 計画どおりの順序でファイルデータを並べる
+            file_data = [(plan[i][0], excel_data) for i, excel_data in enumerate(rendered) if excel_data is not None]
+
+            # 書き出しのために読み込んだ教科をメモリ上限に合わせて解放する
+            self._evict_cold_subjects()
+
+            if not file_data:
+                if self.export_errors:
+                    return f"保存中にエラーが発生しました: {self.export_errors[0][1]}"
+                return "保存するデータがありません。"
+            return file_data
+        except Exception as e:
+            return f"保存中にエラーが発生しました: {str(e)}"
+
+    def _export_plan(self, timestamp, extension="xlsx"):
+        """書き出すファイルの (ファイル名, キャッシュキー, DataFrame作成関数, シート名) のリストを作成する
+
+        キャッシュキーには教科のバージョンを含めるため、データが変わるとキーも変わる。
+        """
+        plan = []
+
+        # 空のデータはスキップ
+        subjects = [(subject, data) for subject, data in self.subjects.items() if data]
+
+        # 教科が2つ以上ある場合、すべての教科のデータを個別に保存
+        if len(subjects) >= 2:
+            for subject, data in subjects:
+                # ファイル名に教科名を含める
+                file_name = f"学習問題分析結果_{subject}_{timestamp}.{extension}"
+                plan.append((file_name, (subject, data.version), partial(self._subject_frame, data), subject))
+
+            # 全科目の統合ファイルも作成
+            all_file_name = f"学習問題分析結果_全教科統合_{timestamp}.{extension}"
+            all_key = ("全教科統合",) + tuple((subject, data.version) for subject, data in subjects)
+            plan.append((all_file_name, all_key, partial(self._combined_frame, [data for _, data in subjects]), "全教科統合"))
+
+        # 教科が1つだけの場合、現在の教科のデータだけを保存
+        elif self.current_subject in self.subjects and self.subjects[self.current_subject]:
+            data = self.subjects[self.current_subject]
+
+            # ファイル名に教科名を含める
+            file_name = f"学習問題分析結果_{self.current_subject}_{timestamp}.{extension}"
+            plan.append((file_name, (self.current_subject, data.version), partial(self._subject_frame, data), self.current_subject))
+
+        return plan
+
+    def _subject_frame(self, data):
+        """教科のDataFrameを作成し、グループ番号で昇順に並び替える"""
+        return data.to_frame(self.groups).sort_values('グループ番号')
+
+    def _combined_frame(self, subject_data):
+        """全教科を統合したDataFrameを作成し、教科ごとにグループ番号で整理する"""
+        import pandas as pd
+
+        # 各教科のDataFrameには教科列が含まれている
+        all_df = pd.concat([data.to_frame(self.groups) for data in subject_data], ignore_index=True)
+        return all_df.sort_values(['教科', 'グループ番号'])
+
+    def save_snapshot(self, path):
+        """すべての教科のデータ・現在の教科・試行の記録をバイナリ形式のスナップショットに保存する
+
+        形式は snapshot.py を参照。人が見るためのファイルは save_results のExcelを使う。
+        ストレージがある場合、メモリ上の試行の記録は読み込み後のものだけなので、
+        変更を保存してからストレージのすべての試行を書き出す。
+        """
+        import snapshot
+
+        try:
+            # ストレージにだけある教科も含める
+            self._load_stored_subjects()
+            subjects = self.subjects
+            if self.storage is not None:
+                self._persist()
+                subjects = {
+                    subject: SubjectRecords.from_columns(subject, *data.columns(), history=self.storage.history(subject))
+                    for subject, data in self.subjects.items()
+                }
+            snapshot.write(path, subjects, self.current_subject)
+            self._evict_cold_subjects()
+            return f"{len(subjects)}教科のデータをスナップショットに保存しました。"
+        except Exception as e:
+            return f"スナップショットの保存中にエラーが発生しました: {str(e)}"
+
+    def load_snapshot(self, path):
+        """save_snapshot で保存したスナップショットから状態を復元する（現在のデータは置き換える）
+
+        ストレージがある場合は、スナップショットにある教科のレコードを置き換え、保存されていない
+        試行だけを追加する。スナップショットにない教科と保存済みの試行はそのまま残す。
+        """
+        import snapshot
+
+        try:
+            subjects, current_subject = snapshot.read(path)
+            if self.storage is not None:
+                self.storage.restore(list(subjects.values()))
+        except Exception as e:
+            return f"スナップショットの読み込み中にエラーが発生しました: {str(e)}"
+
+        self.subjects = subjects
+        self.current_subject = current_subject
+        self.results = subjects.get(current_subject)
+        if self.results is None:
+            self.results = SubjectRecords(current_subject)
+        self._recent_subjects = OrderedDict.fromkeys(subjects)
+        # 復元したデータを同じファイルから再度インポートできるようにする
+        self._imported_digests.clear()
+        self._evict_cold_subjects()
+        return f"{len(subjects)}教科のデータをスナップショットから復元しました。"
+
+    def bundle_results(self, file_data):
+        """save_resultsで作成したファイルを1つのZIPファイル（deflate圧縮）にまとめる"""
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        output = BytesIO()
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+            for file_name, data in file_data:
+                bundle.writestr(file_name, data)
+        return f"学習問題分析結果_{timestamp}.zip", output.getvalue()
+
+    def import_excel(self, uploaded_files, progress=None):
+        """アップロードされたファイルからデータをインポートする
+
+        ファイルの形式は拡張子で決める（.csv はCSV、.parquet はParquet、それ以外はExcel）。
+
+        ファイルは内容のハッシュで識別する。読み込んだDataFrameはハッシュを
+        キーにキャッシュし、すでに取り込んだファイルは何もせずに読み飛ばす。
+        キャッシュにないファイルは import_workers が2以上なら並列に読み込み、
+        progress を渡すと1ファイル読み終えるたびに progress(完了数, 総数) を呼ぶ。
+        取り込めなかったファイルや行は import_errors にまとめる。
+        """
+        import pandas as pd
+
+        try:
+            self.import_errors = _error_frame()
+            if not uploaded_files:
+                return "ファイルがアップロードされていません。"
+
+            total_imported = 0
+            imported_subjects = set()
+            skipped_files = 0
+
+            # StreamlitのUploadedFileオブジェクトからデータを読み込み、内容で識別する
+            uploads = {}  # 内容ハッシュ -> (ファイル名, データ)（同じ内容のファイルは1つにまとめる）
+            for uploaded_file in uploaded_files:
+                data = uploaded_file.getvalue()
+                digest = hashlib.sha256(data).hexdigest()
+                if digest in self._imported_digests or digest in uploads:
+                    skipped_files += 1
+                    continue
+                uploads[digest] = (getattr(uploaded_file, 'name', ""), data)
+            uploads = [(digest, name, data) for digest, (name, data) in uploads.items()]
+
+            # キャッシュにないファイルだけをワーカーで読み込む
+            frames = [_PARSED_IMPORTS.get(digest) for digest, _, _ in uploads]
+            pending = [i for i, df in enumerate(frames) if df is None]
+            jobs = [(uploads[i][2], uploads[i][1]) for i in pending]
+            outcomes = _run_jobs(_read_table_frame, jobs, self.import_workers, self.import_executor, progress)
+            file_errors = []
+            for i, (df, error) in zip(pending, outcomes):
+                if error is None:
+                    _PARSED_IMPORTS.put(uploads[i][0], df)
+                    frames[i] = df
+                else:
+                    file_errors.append(_error_frame(uploads[i][1], None, None, None, f"ファイルを読み込めませんでした: {error}"))
+
+            prepared = []
+            row_errors = []
+            digests = []  # 取り込み済みにするファイルの内容ハッシュ
+            for (digest, file_name, _), df in zip(uploads, frames):
+                # 読み込めなかったファイルはスキップ
+                if df is None:
+                    continue
+                digests.append(digest)
+
+                # 必要なカラムが存在するか確認
+                required_columns = ['問題番号', 'グループ番号', '学習方法']
+                missing_columns = [col for col in required_columns if col not in df.columns]
+                if missing_columns:
+                    file_errors.append(_error_frame(file_name, None, "、".join(missing_columns), None, "必要な列がありません"))
+                    continue
+
+                frame, errors = self._prepare_import_frame(df, file_name)
+                prepared.append(frame)
+                row_errors.append(errors)
+
+            self.import_errors = _concat_errors(file_errors + row_errors)
+
+            if prepared:
+                # すべてのファイルをまとめ、問題番号ごとに取り込む行を決める
+                merged = pd.concat(prepared, ignore_index=True)
+                if self.import_policy == "latest":
+                    # 後から読み込んだ行を優先する
+                    merged = merged.drop_duplicates(['教科', '問題番号'], keep='last')
+
+                # 教科ごとにデータを振り分ける
+                for subject, group_df in merged.groupby('教科'):
+                    subject = sys.intern(subject)
+
+                    # 該当する教科のデータに追加（現在の教科は編集中のデータに追加する）
+                    if subject == self.current_subject and subject not in self.subjects:
+                        self.subjects[subject] = self.results
+                    data = self._subject_records(subject)
+
+                    columns = (group_df['問題番号'], group_df['グループ番号'], group_df['コメント'])
+                    if self.import_policy == "latest":
+                        data.merge(*columns)
+                    else:
+                        data.extend(*columns)
+                    total_imported += len(group_df)
+                    imported_subjects.add(subject)
+                self._persist()
+
+            # 保存に失敗したファイルはもう一度取り込めるよう、保存できてから取り込み済みにする
+            self._imported_digests.update(digests)
+
+            # 現在の教科を更新
+            if self.current_subject in self.subjects:
+                self.results = self.subjects[self.current_subject]
+
+            if total_imported > 0:
+                message = f"{total_imported}件のデータを{len(imported_subjects)}教科にインポートしました。"
+                if len(self.import_errors):
+                    message += f"（取り込めなかったデータが{len(self.import_errors)}件あります）"
+                return message
+            elif skipped_files > 0:
+                return "選択されたファイルはすでにインポート済みです。"
+            else:
+                return "インポートできるデータが見つかりませんでした。"
+                
+        except Exception as e:
+            return f"インポート中にエラーが発生しました: {str(e)}"
+
+    def _prepare_import_frame(self, df, file_name):
+        """インポートしたDataFrameを検証・型変換し、(取り込む行, エラー一覧) を返す
+
+        検証と型変換は列単位でまとめて行う。取り込む行は 問題番号・グループ番号・
+        コメント・教科 の4列にそろえ、エラーにはExcel上の行番号を付ける。
+        """
+        import pandas as pd
+
+        errors = []
+
+        def reject(mask, column, message):
+            if mask.any():
+                errors.append(_error_frame(file_name, df.index[mask] + 2, column, df.loc[mask, column].fillna("").astype(str), message))
+
+        # 問題番号は1以上の整数
+        problem_numbers = pd.to_numeric(df['問題番号'], errors='coerce')
+        reject(problem_numbers.isna(), '問題番号', "問題番号が空か数値ではありません")
+        invalid_numbers = problem_numbers.notna() & ((problem_numbers % 1 != 0) | (problem_numbers < 1))
+        reject(invalid_numbers, '問題番号', "問題番号は1以上の整数にしてください")
+
+        # グループ番号は定義済みのグループのいずれか
+        groups = pd.to_numeric(df['グループ番号'], errors='coerce')
+        reject(groups.isna(), 'グループ番号', "グループ番号が空か数値ではありません")
+        invalid_groups = groups.notna() & ~groups.isin(list(self.groups))
+        reject(invalid_groups, 'グループ番号', f"グループ番号は{min(self.groups)}〜{max(self.groups)}の整数にしてください")
+
+        valid = problem_numbers.notna() & ~invalid_numbers & groups.notna() & ~invalid_groups
+
+        # 教科列がない場合は現在の教科として扱う
+        if '教科' in df.columns:
+            blank_subjects = df['教科'].isna() | (df['教科'].astype(str).str.strip() == "")
+            reject(blank_subjects, '教科', "教科が空です")
+            valid &= ~blank_subjects
+            subjects = df.loc[valid, '教科'].astype(str)
+        else:
+            subjects = self.current_subject
+
+        # コメント列がない場合は空文字として扱う
+        if 'コメント' in df.columns:
+            comments = df.loc[valid, 'コメント'].fillna("").astype(str)
+        else:
+            comments = ""
+
+        frame = pd.DataFrame({
+            '問題番号': problem_numbers[valid].astype('int64'),
+            'グループ番号': groups[valid].astype('int64'),
+            'コメント': comments,
+            '教科': subjects
+        }, index=df.index[valid])
+
+        return frame, _concat_errors(errors)
+
+    @property
+    def data_version(self):
+        """すべての教科のデータのバージョン（いずれかの教科が追加・変更されると変わる）"""
+        return tuple((subject, data.version) for subject, data in self.subjects.items())
+
+    def attempt_history(self, problem_number):
+        """現在の教科の問題について、これまでのすべての試行を古い順に返す
+
+        ストレージがある場合、試行は記録のたびに保存されているのでストレージから読む。
+        """
+        if self.storage is not None:
+            return self.storage.attempts(self.current_subject, problem_number)
+        return self.results.history.attempts(problem_number)
+
+    def get_subject_summary(self):
+        """教科ごとのデータ数と状況をまとめたテキストを返す
+
+        テキストはデータのバージョンごとに1回だけ作成し、変更がなければ前回の結果を返す。
+        """
+        version = self.data_version
+        if self._summary is not None and self._summary[0] == version:
+            return self._summary[1]
+
+        subject_info = []
+
+        # 教科ごとの (問題数, グループ1の件数, グループ2の件数)。読み込んでいない教科は
+        # ストレージのメタデータから、読み込み済みの教科はメモリ上の集計カウンターから求める
+        counts = self.storage.summary() if self.storage is not None else {}
+        counts.update((subject, data.counts()) for subject, data in self.subjects.items())
+
+        for subject, (total_problems, group_1_count, group_2_count) in counts.items():
+            if total_problems:  # データがある場合のみ
+                score_rate = ((group_1_count + group_2_count) / total_problems) * 100
+                perfect_rate = (group_1_count / total_problems) * 100
+
+                subject_info.append(f"教科「{subject}」: {total_problems}問 (得点率: {score_rate:.1f}%, 完全解答率: {perfect_rate:.1f}%)")
+
+        if subject_info:
+            summary = "【分析済み教科の概要】\n" + "\n".join(subject_info)
+        else:
+            summary = "分析済みのデータがありません。"
+        self._summary = (version, summary)
+        return summary
+
+    def reset_subject(self):
+        """教科の選択を解除する（各教科のデータは保持する）"""
+        self.current_subject = "未設定"
+        self.results = SubjectRecords(self.current_subject)
+
+    def clear_current_subject(self):
+        """現在の教科の分析データを消去する（消去できなかった場合はエラーメッセージを返す）"""
+        try:
+            self.results.clear()
+            self.subjects[self.current_subject] = self.results
+            self._persist()
+        except Exception as e:
+            return f"消去中にエラーが発生しました: {str(e)}"
+        # 消去したデータを同じファイルから再度インポートできるようにする
+        self._imported_digests.clear()
+
+def _run_jobs(fn, jobs, workers=1, executor="process", progress=None):
+    """jobs の各引数タプルで fn を実行し、(結果, エラー) のリストを入力順で返す
+
+    workers が2以上でジョブが複数あれば、プロセスまたはスレッドのプールで並列に実行する。
+    progress を渡すと、ジョブが1つ終わるたびに progress(完了数, 総数) を呼ぶ。
+    """
+    outcomes = [None] * len(jobs)
+
+    if workers <= 1 or len(jobs) <= 1:
+        for i, args in enumerate(jobs):
+            try:
+                outcomes[i] = (fn(*args), None)
+            except Exception as e:
+                outcomes[i] = (None, e)
+            if progress:
+                progress(i + 1, len(jobs))
+        return outcomes
+
+    executor_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    with executor_class(max_workers=min(workers, len(jobs))) as pool:
+        futures = {pool.submit(fn, *args): i for i, args in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                outcomes[futures[future]] = (future.result(), None)
+            except Exception as e:
+                outcomes[futures[future]] = (None, e)
+            if progress:
+                progress(done, len(jobs))
+    return outcomes
+
+def _write_workbook(df, sheet_name):
+    """書き込み専用のストリーミングワークブックでDataFrameをExcel形式に書き出す
+
+    列幅とセルの書式は書き込み前に列単位で決めておき、行は1行ずつ
+    シートへ流し込む。書式オブジェクトは列ごとに1つを全行で共有する。
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=sheet_name)
+
+    # 列幅は行を書き込む前に設定する必要がある
+    for i, col_width in enumerate(_plan_column_widths(df)):
+        worksheet.column_dimensions[get_column_letter(i + 1)].width = col_width
+
+    # 長文の列はテキストを折り返す
+    wrap_columns = [i for i, column in enumerate(df.columns) if column in WRAP_COLUMNS]
+    wrap_alignment = Alignment(wrap_text=True)
+
+    # ヘッダー行（pandasのto_excelと同じ書式）
+    header_font = Font(bold=True)
+    thin = Side(style="thin")
+    header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_alignment = Alignment(horizontal="center", vertical="top")
+    header_wrap_alignment = Alignment(horizontal="center", vertical="top", wrap_text=True)
+    header = []
+    for i, column in enumerate(df.columns):
+        cell = WriteOnlyCell(worksheet, value=str(column))
+        cell.font = header_font
+        cell.border = header_border
+        cell.alignment = header_wrap_alignment if i in wrap_columns else header_alignment
+        header.append(cell)
+    worksheet.append(header)
+
+    # データ行
+    for row in df.itertuples(index=False, name=None):
+        values = list(row)
+        for i in wrap_columns:
+            cell = WriteOnlyCell(worksheet, value=values[i])
+            cell.alignment = wrap_alignment
+            values[i] = cell
+        worksheet.append(values)
+
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+def _plan_column_widths(df):
+    """各列の幅を書き込み前にまとめて計算する
+
+    改行を含む値は最長の行で測り、全角文字は2文字分として数える。
+    学習方法の列はグループ番号ごとにキャッシュした幅を使う。
+    """
+    widths = []
+    for column in df.columns:
+        if column == '学習方法' and 'グループ番号' in df.columns:
+            data_len = max((_method_width(group) for group in df['グループ番号'].unique()), default=0)
+        else:
+            data_len = _column_display_width(df[column])
+        max_len = max(_display_width(str(column)), data_len)
+        # 特定の列には最小幅を設定
+        if column in WRAP_COLUMNS:
+            max_len = max(max_len, 50)
+
+        # 列幅を設定（最大幅は100）
+        widths.append(min(max_len + 2, 100))
+    return widths
+
+def _method_width(group):
+    """グループ番号に対応する学習方法の表示幅を返す（一度計算したらキャッシュする）"""
+    width = _METHOD_WIDTHS.get(group)
+    if width is None:
+        width = _METHOD_WIDTHS[group] = _display_width(LEARNING_METHODS[group])
+    return width
+
+def _write_csv_job(df, sheet_name=None, chunk_size=CSV_CHUNK_ROWS):
+    """DataFrameをBOM付きUTF-8のCSVとして chunk_size 行ずつ書き出す（Excelで開いても文字化けしない）"""
+    output = BytesIO()
+    df.to_csv(output, index=False, encoding="utf-8-sig", chunksize=chunk_size)
+    return output.getvalue()
+
+def _write_parquet_job(df, sheet_name=None):
+    """DataFrameをParquet形式で書き出す（pyarrowが必要）"""
+    output = BytesIO()
+    df.to_parquet(output, index=False)
+    return output.getvalue()
+
+# 保存形式ごとの書き出し関数（DataFrame, シート名 -> バイト列）
+_EXPORT_WRITERS = {
+    "xlsx": _write_workbook,
+    "csv": _write_csv_job,
+    "parquet": _write_parquet_job,
+}
+
+def _read_table_frame(data, file_name=""):
+    """ファイル名の拡張子に応じてCSV・Parquet・Excelのいずれかとして読み込む"""
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == ".csv":
+        return _read_csv_frame(data)
+    if extension == ".parquet":
+        return _read_parquet_frame(data)
+    return _read_workbook_frame(data)
+
+def _read_csv_frame(data, chunk_size=CSV_CHUNK_ROWS):
+    """CSVファイルを chunk_size 行ずつ読み、DataFrameを作成する
+
+    文字列の列は空欄だけを欠損値とし、"NA" などのコメントはそのまま文字列として読む。
+    インデックスはExcelと同じく見出しの次の行を0とする。
+    """
+    import pandas as pd
+
+    reader = pd.read_csv(
+        BytesIO(data), encoding="utf-8-sig", chunksize=chunk_size,
+        dtype={'学習方法': str, 'コメント': str, '教科': str}, keep_default_na=False, na_values=[""]
+    )
+    chunks = list(reader)
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks).dropna(how='all')
+
+def _read_parquet_frame(data):
+    """Parquetファイルを読み込む（pyarrowが必要）"""
+    import pandas as pd
+
+    return pd.read_parquet(BytesIO(data)).reset_index(drop=True)
+
+def _read_workbook_frame(data, chunk_size=10000):
+    """Excelファイルの先頭シートをread-onlyモードで1行ずつ読み、DataFrameを作成する
+
+    セルオブジェクトを保持しないストリーミング読み込みのため、メモリ使用量は
+    ほぼ値そのものの大きさに収まる。行はchunk_size行ずつDataFrameにまとめる。
+    """
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(BytesIO(data), read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        # ファイルに記録された範囲（<dimension>）は実際のセルと違うことがあるため使わず、すべての行を読む
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+
+        # 見出しが空の列はpandasと同じく "Unnamed: n" とする
+        columns = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+        chunks = []
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            # 範囲を使わないと行ごとにセルの数が違うため、最も長い行に合わせて None で埋める
+            width = max(len(columns), max(map(len, chunk)))
+            columns += [f"Unnamed: {i}" for i in range(len(columns), width)]
+            chunk = [row if len(row) == width else tuple(row) + (None,) * (width - len(row)) for row in chunk]
+            chunks.append(pd.DataFrame.from_records(chunk, columns=columns))
+    finally:
+        workbook.close()
+
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    # 空行は読み飛ばす（インデックスはエラー表示用にシート上の位置のまま残す）
+    return pd.concat(chunks, ignore_index=True).dropna(how='all')
@@ -0,0 +1,167 @@
+"""ProblemAnalyzer の状態を保存するバイナリ形式のスナップショット
+
+教科ごとのレコード、現在の教科、試行の記録をまとめて1つのファイルに書き出す。
+xlsx と違って型の情報を失わず、配列はそのままのバイト列で書き出すため、
+保存と復元は配列のコピーだけで済む。読み込みはファイルをメモリマップし、
+チェックサムの計算と配列の取り出しをコピーなしのビューで行う。
+
+ファイルの構成（数値はすべてリトルエンディアン）:
+
+    マジック（8バイト） バージョン（uint16） 予備（uint16） ヘッダー長（uint32）
+    ヘッダー（UTF-8のJSON。8バイト境界まで0で埋める）
+    セクション（配列のバイト列またはコメントのJSON。それぞれ8バイト境界まで0で埋める）
+        コメントのJSONは {"strings": [コメントの文字列], "entries": [[行番号, 文字列の番号], ...]}
+        （重複問題の比較コメントなど、同じ文字列は1回だけ書き出す）
+    チェックサム（それより前の全バイトのCRC-32、uint32）
+
+ヘッダーには現在の教科名と、教科ごとのセクションの位置（ヘッダー直後からのオフセットと長さ）を持つ。
+"""
+import json
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
+from problem_analyzer import AttemptLog, SubjectRecords
+
+MAGIC = b"PASNAP\x00\x00"
+FORMAT_VERSION = 1
+EXTENSION = ".pasnap"
+
+_PREAMBLE = struct.Struct("<8sHHI")
+_CHECKSUM = struct.Struct("<I")
+
+# 教科ごとのセクションの並び（名前, array の型コード。None はコメントのJSON）
+_SECTIONS = [
+    ("problem_numbers", 'q'),
+    ("groups", 'b'),
+    ("comments", None),
+    ("attempt_problem_numbers", 'q'),
+    ("attempt_groups", 'b'),
+    ("attempt_recorded_at", 'd'),
+    ("attempt_comments", None),
+]
+
+
+def _padding(length):
+    return b"\x00" * (-length % 8)
+
+
+def _array_bytes(values):
+    """array をリトルエンディアンのバイト列にする"""
+    if sys.byteorder == "little" or values.itemsize == 1:
+        return values.tobytes()
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _array_from(typecode, view):
+    """リトルエンディアンのバイト列のビューから array を作る"""
+    values = array(typecode)
+    values.frombytes(view)
+    if sys.byteorder != "little" and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+
+def _comments_bytes(comments):
+    """{行番号: コメント} を文字列表つきのJSONにする"""
+    strings = {}
+    entries = [[slot, strings.setdefault(comment, len(strings))] for slot, comment in sorted(comments.items())]
+    return json.dumps({"strings": list(strings), "entries": entries}, ensure_ascii=False).encode("utf-8")
+
+
+def _comments_from(view):
+    """文字列表つきのJSONから {行番号: コメント} を復元する"""
+    comments = json.loads(bytes(view))
+    strings = comments["strings"]
+    return {slot: strings[index] for slot, index in comments["entries"]}
+
+
+def dumps(subjects, current_subject):
+    """教科のレコード（{教科名: SubjectRecords}）と現在の教科をスナップショットのバイト列にする"""
+    body = []
+    offset = 0
+    subject_headers = []
+    for subject, data in subjects.items():
+        problem_numbers, groups, comments = data.columns()
+        attempt_problem_numbers, attempt_groups, attempt_recorded_at, attempt_comments = data.history.columns()
+        sections = [
+            _array_bytes(problem_numbers),
+            _array_bytes(groups),
+            _comments_bytes(comments),
+            _array_bytes(attempt_problem_numbers),
+            _array_bytes(attempt_groups),
+            _array_bytes(attempt_recorded_at),
+            _comments_bytes(attempt_comments),
+        ]
+        positions = {}
+        for (name, _), section in zip(_SECTIONS, sections):
+            positions[name] = [offset, len(section)]
+            body.append(section)
+            body.append(_padding(len(section)))
+            offset += len(section) + len(body[-1])
+        subject_headers.append({"name": subject, "sections": positions})
+
+    header = json.dumps({"current_subject": current_subject, "subjects": subject_headers}, ensure_ascii=False).encode("utf-8")
+    content = b"".join([_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(header)), header, _padding(len(header))] + body)
+    return content + _CHECKSUM.pack(zlib.crc32(content))
+
+
+def write(path, subjects, current_subject):
+    """スナップショットをファイルに書き出す"""
+    with open(path, "wb") as f:
+        f.write(dumps(subjects, current_subject))
+
+
+def _parse(view):
+    """スナップショットのバイト列のビューを検証し、({教科名: SubjectRecords}, 現在の教科) を返す"""
+    if len(view) < _PREAMBLE.size + _CHECKSUM.size:
+        raise ValueError("スナップショットの形式が正しくありません。")
+    magic, version, _, header_length = _PREAMBLE.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("スナップショットの形式が正しくありません。")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"対応していないスナップショットのバージョンです: {version}")
+    (checksum,) = _CHECKSUM.unpack_from(view, len(view) - _CHECKSUM.size)
+    if zlib.crc32(view[:-_CHECKSUM.size]) != checksum:
+        raise ValueError("スナップショットのチェックサムが一致しません。ファイルが壊れている可能性があります。")
+
+    header = json.loads(bytes(view[_PREAMBLE.size:_PREAMBLE.size + header_length]))
+    body_start = _PREAMBLE.size + header_length + len(_padding(header_length))
+
+    subjects = {}
+    for subject_header in header["subjects"]:
+        columns = {}
+        for name, typecode in _SECTIONS:
+            offset, length = subject_header["sections"][name]
+            section = view[body_start + offset:body_start + offset + length]
+            if typecode is None:
+                columns[name] = _comments_from(section)
+            else:
+                columns[name] = _array_from(typecode, section)
+            section.release()
+
+        subject = sys.intern(subject_header["name"])
+        history = AttemptLog.from_columns(
+            columns["attempt_problem_numbers"], columns["attempt_groups"], columns["attempt_recorded_at"], columns["attempt_comments"]
+        )
+        subjects[subject] = SubjectRecords.from_columns(
+            subject, columns["problem_numbers"], columns["groups"], columns["comments"], history
+        )
+    return subjects, header["current_subject"]
+
+
+def loads(data):
+    """スナップショットのバイト列から ({教科名: SubjectRecords}, 現在の教科) を復元する"""
+    with memoryview(data) as view:
+        return _parse(view)
+
+
+def read(path):
+    """スナップショットのファイルをメモリマップして ({教科名: SubjectRecords}, 現在の教科) を復元する"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            return _parse(view)
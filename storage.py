@@ -0,0 +1,335 @@
+"""ProblemAnalyzer の教科データを保存するストレージ
+
+ProblemAnalyzer(storage=...) に渡すオブジェクトは次のメソッドを持つ。
+
+    load(subject)      教科のレコードを読み込んだ SubjectRecords を返す（保存されていなければNone）
+    save(subjects)     SubjectRecords のリストのうち、変更のあったものを1回のトランザクションで保存する
+                       （読み込んだ後に別のセッションで更新された教科があれば、何も保存せずに
+                       その教科名のリストを subjects 属性に持つ ValueError を送出する）。
+                       保存した試行は SubjectRecords.history から外してよい
+    subjects()         保存されている教科名のリストを返す
+    summary()          {教科名: (問題数, グループ1の件数, グループ2の件数)} を返す
+    is_saved(data)     SubjectRecords の現在のバージョンが保存済みかを返す
+    attempts(subject, problem_number)  問題のすべての試行を古い順に返す
+    history(subject)   教科のすべての試行を古い順に記録した AttemptLog を返す
+    restore(subjects)  スナップショットから復元した SubjectRecords のリストでレコードを置き換える
+
+SQLiteStorage はローカルのSQLiteデータベース（WALモード）に生徒ごとのレコードを保存する。
+教科ごとのレコードは (生徒, 教科) 単位のシャードとして個別に読み書きし、教科の一覧と
+概要の件数は subjects テーブルの小さなメタデータから返す。
+records テーブルは (生徒, 教科, 問題番号) ごとに最新の1行だけを持つ。同じ問題番号の行を
+すべて残すインポート（import_policy="history"）でも、保存されるのは最新の行だけで、
+それ以前の行は attempts テーブルの試行として残る。
+同じ生徒のデータを複数のセッションで開いた場合に古いデータで上書きしないよう、
+subjects テーブルには教科ごとのリビジョンを持ち、保存のたびに1つ増やす。
+"""
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+
+from problem_analyzer import AttemptLog, SubjectRecords
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    student TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    problem_number INTEGER NOT NULL,
+    group_number INTEGER NOT NULL,
+    comment TEXT NOT NULL DEFAULT ''
+);
+CREATE UNIQUE INDEX IF NOT EXISTS records_student_subject_problem_unique ON records (student, subject, problem_number);
+CREATE TABLE IF NOT EXISTS attempts (
+    student TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    problem_number INTEGER NOT NULL,
+    group_number INTEGER NOT NULL,
+    comment TEXT NOT NULL DEFAULT '',
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_student_subject_problem ON attempts (student, subject, problem_number);
+CREATE TABLE IF NOT EXISTS subjects (
+    student TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    group_1 INTEGER NOT NULL,
+    group_2 INTEGER NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (student, subject)
+);
+"""
+
+
+class StaleSubjectError(ValueError):
+    """読み込んだ後に別のセッションで更新された教科を保存しようとした"""
+
+    def __init__(self, subjects):
+        self.subjects = subjects
+        super().__init__(
+            f"教科「{'」「'.join(subjects)}」は別のセッションで更新されています。"
+            "最新のデータを読み込み直したので、もう一度記録してください。"
+        )
+
+
+class SQLiteStorage:
+    """生徒ごとの教科データをSQLiteデータベースに保存する
+
+    レコードは教科の挿入順（position）で保存し、読み込み時も同じ順序に戻す。
+    保存時は前回の保存・読み込みからバージョンが変わった教科について、その後に記録された
+    試行の問題番号の行だけを置き換える（1問の記録なら1行の書き込みで済む）。
+    試行の記録（attempts）は追記専用で、前回の保存以降に増えた試行だけを追加する。
+    読み込むのは records の最新の状態だけで、過去の試行は attempts() で必要なときに読む。
+    保存した教科の history は空の AttemptLog に置き換え、保存済みの試行をメモリに残さない。
+    保存時は教科ごとに読み込んだときのリビジョンとデータベース上のリビジョンを比べ、
+    別のセッションが先に保存していればその教科を保存しない。
+    Streamlitはスクリプトを別々のスレッドで実行するため、接続はロックで保護する。
+    """
+
+    def __init__(self, path, student):
+        self.path = path
+        self.student = str(student)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._saved_versions = {}  # 教科名 -> 保存済みのバージョン
+        self._saved_history = {}  # 教科名 -> (保存済みの AttemptLog, 保存済みの件数)
+        self._next_positions = {}  # 教科名 -> 次に追加する行の position
+        self._revisions = {}  # 教科名 -> 読み込み・保存したときのリビジョン
+        with self._lock:
+            # 読み込みと書き込みが互いを待たないようにWALモードにする
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+
+    def load(self, subject):
+        """教科のレコードを読み込む（保存されていない場合はNone）"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT position, problem_number, group_number, comment FROM records WHERE student = ? AND subject = ? ORDER BY position",
+                (self.student, subject)
+            ).fetchall()
+            self._revisions[subject] = self._revision(subject)
+        if not rows:
+            return None
+
+        data = SubjectRecords(subject)
+        positions, problem_numbers, groups, comments = zip(*rows)
+        data.extend(problem_numbers, groups, comments)
+        # 過去の試行はすでに保存されているので、読み込んだ行は新しい試行として記録しない
+        data.history = AttemptLog()
+        self._saved_versions[data.subject] = data.version
+        self._saved_history[data.subject] = (data.history, 0)
+        self._next_positions[data.subject] = positions[-1] + 1
+        return data
+
+    def save(self, subjects):
+        """変更のあった教科を1回のトランザクションでまとめて保存する
+
+        前回の保存と同じ試行の記録を持つ教科は、それ以降の試行の問題番号の行だけを書き込む。
+        試行の記録が新しくなった教科（データを消去した教科や、読み込まずに作成した教科）は
+        レコードと試行をすべて書き直す。
+        """
+        changed = [data for data in subjects if self._saved_versions.get(data.subject) != data.version]
+        if not changed:
+            return
+
+        with self._lock, self._connection:
+            # リビジョンの確認から書き込みまでの間にほかの接続が書き込まないよう、先に書き込みロックを取る
+            self._connection.execute("BEGIN IMMEDIATE")
+            revisions = {data.subject: self._revision(data.subject) for data in changed}
+            stale = [data.subject for data in changed if revisions[data.subject] != self._revisions.get(data.subject, 0)]
+            if stale:
+                # 古いデータは捨て、次に教科を選んだときに読み直す
+                for subject in stale:
+                    self._forget(subject)
+                raise StaleSubjectError(stale)
+
+            for data in changed:
+                revisions[data.subject] += 1
+                history, saved_count = self._saved_history.get(data.subject, (None, 0))
+                if history is data.history:
+                    self._write_changes(data, saved_count, revisions[data.subject])
+                else:
+                    self._rewrite(data, revisions[data.subject])
+        for data in changed:
+            # 保存した試行は attempts テーブルから読むので、メモリ上の記録からは外す
+            data.history = AttemptLog()
+            self._saved_versions[data.subject] = data.version
+            self._saved_history[data.subject] = (data.history, 0)
+            self._revisions[data.subject] = revisions[data.subject]
+
+    def _revision(self, subject):
+        """データベース上の教科のリビジョンを返す（保存されていない教科は0）"""
+        row = self._connection.execute(
+            "SELECT revision FROM subjects WHERE student = ? AND subject = ?", (self.student, subject)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _forget(self, subject):
+        """教科について読み込み・保存したときの情報を消す"""
+        for saved in (self._saved_versions, self._saved_history, self._next_positions, self._revisions):
+            saved.pop(subject, None)
+
+    def _write_changes(self, data, saved_count, revision):
+        """saved_count 件目以降の試行の問題番号について、最新の行だけを置き換える"""
+        key = (self.student, data.subject)
+        attempts = data.history.rows(saved_count)
+        # 問題番号は最後に記録された順に並べ、その順に新しい position を振る
+        problem_numbers = list(dict.fromkeys(reversed([row[0] for row in attempts])))[::-1]
+        position = self._next_positions[data.subject]
+        delta = [0, 0, 0]  # (問題数, グループ1の件数, グループ2の件数) の増減
+
+        def tally(group, sign):
+            delta[0] += sign
+            if group <= 2:
+                delta[group] += sign
+
+        for problem_number in problem_numbers:
+            old = self._connection.execute(
+                "SELECT group_number FROM records WHERE student = ? AND subject = ? AND problem_number = ?", key + (problem_number,)
+            ).fetchone()
+            if old is not None:
+                tally(old[0], -1)
+            record = data.get(problem_number)
+            if record is None:
+                self._connection.execute(
+                    "DELETE FROM records WHERE student = ? AND subject = ? AND problem_number = ?", key + (problem_number,)
+                )
+                continue
+            self._connection.execute(
+                "INSERT OR REPLACE INTO records (student, subject, position, problem_number, group_number, comment) VALUES (?, ?, ?, ?, ?, ?)",
+                key + (position, problem_number, record['グループ番号'], record['コメント'])
+            )
+            tally(record['グループ番号'], 1)
+            position += 1
+        self._next_positions[data.subject] = position
+
+        # 教科の一覧と概要に使う件数を増減し、リビジョンを更新する
+        self._connection.execute(
+            "INSERT INTO subjects (student, subject, total, group_1, group_2, revision) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (student, subject) DO UPDATE SET total = total + excluded.total, "
+            "group_1 = group_1 + excluded.group_1, group_2 = group_2 + excluded.group_2, revision = excluded.revision",
+            key + tuple(delta) + (revision,)
+        )
+        self._insert_attempts(data.subject, attempts)
+
+    def _rewrite(self, data, revision):
+        """教科のレコードと試行をすべて書き直す"""
+        self._write_records(data, revision)
+        self._connection.execute("DELETE FROM attempts WHERE student = ? AND subject = ?", (self.student, data.subject))
+        self._insert_attempts(data.subject, data.history.rows())
+
+    def _write_records(self, data, revision):
+        """教科のレコードをすべて書き直し、件数とリビジョンを更新する"""
+        key = (self.student, data.subject)
+        self._connection.execute("DELETE FROM records WHERE student = ? AND subject = ?", key)
+        # 同じ問題番号の行が複数ある場合は、後の行で置き換えて最新の行だけを残す
+        rows = data.rows()
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO records (student, subject, position, problem_number, group_number, comment) VALUES (?, ?, ?, ?, ?, ?)",
+            (key + (position, problem_number, group, comment) for position, (problem_number, group, comment) in enumerate(rows))
+        )
+        self._next_positions[data.subject] = len(rows)
+
+        # 教科の一覧と概要に使う件数とリビジョンを更新する（空になった教科もリビジョンのために行を残す）
+        counts = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(group_number = 1), 0), COALESCE(SUM(group_number = 2), 0) "
+            "FROM records WHERE student = ? AND subject = ?", key
+        ).fetchone()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO subjects (student, subject, total, group_1, group_2, revision) VALUES (?, ?, ?, ?, ?, ?)",
+            key + counts + (revision,)
+        )
+
+    def _insert_attempts(self, subject, attempts):
+        """試行 (問題番号, グループ番号, コメント, 記録日時) を attempts に追記する"""
+        self._connection.executemany(
+            "INSERT INTO attempts (student, subject, problem_number, group_number, comment, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+            ((self.student, subject) + row for row in attempts)
+        )
+
+    def restore(self, subjects):
+        """スナップショットから復元した教科のレコードで保存済みのレコードを置き換える
+
+        別のセッションでの更新があっても上書きする。試行は保存されていないものだけを追加し、
+        スナップショットに含まれない保存済みの試行は消さない。すべての教科を1回のトランザクションで書き込む。
+        """
+        revisions = {}
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            for data in subjects:
+                revisions[data.subject] = self._revision(data.subject) + 1
+                self._write_records(data, revisions[data.subject])
+
+                # 同じ試行（問題番号・グループ番号・コメント・記録日時がすべて同じもの）は件数の差だけ追加する
+                stored = Counter(self._connection.execute(
+                    "SELECT problem_number, group_number, comment, recorded_at FROM attempts WHERE student = ? AND subject = ?",
+                    (self.student, data.subject)
+                ))
+                missing = []
+                for row in data.history.rows():
+                    if stored[row]:
+                        stored[row] -= 1
+                    else:
+                        missing.append(row)
+                self._insert_attempts(data.subject, missing)
+        for data in subjects:
+            data.history = AttemptLog()
+            self._saved_versions[data.subject] = data.version
+            self._saved_history[data.subject] = (data.history, 0)
+            self._revisions[data.subject] = revisions[data.subject]
+
+    def subjects(self):
+        """保存されている教科名のリストを返す"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT subject FROM subjects WHERE student = ? AND total > 0 ORDER BY subject", (self.student,)
+            ).fetchall()
+        return [subject for subject, in rows]
+
+    def summary(self):
+        """教科ごとの (問題数, グループ1の件数, グループ2の件数) を返す"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT subject, total, group_1, group_2 FROM subjects WHERE student = ? AND total > 0 ORDER BY subject",
+                (self.student,)
+            ).fetchall()
+        return {subject: (total, group_1, group_2) for subject, total, group_1, group_2 in rows}
+
+    def is_saved(self, data):
+        """教科のレコードの現在のバージョンが保存済みかを返す"""
+        return self._saved_versions.get(data.subject) == data.version
+
+    def attempts(self, subject, problem_number):
+        """問題のすべての試行を古い順に返す"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT group_number, comment, recorded_at FROM attempts WHERE student = ? AND subject = ? AND problem_number = ? ORDER BY recorded_at, rowid",
+                (self.student, subject, int(problem_number))
+            ).fetchall()
+        return [{
+            '問題番号': int(problem_number),
+            'グループ番号': group,
+            'コメント': comment,
+            '日時': datetime.fromtimestamp(recorded_at)
+        } for group, comment, recorded_at in rows]
+
+    def history(self, subject):
+        """教科のすべての試行を古い順に記録した AttemptLog を返す"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT problem_number, group_number, comment, recorded_at FROM attempts WHERE student = ? AND subject = ? ORDER BY recorded_at, rowid",
+                (self.student, subject)
+            ).fetchall()
+        if not rows:
+            return AttemptLog()
+        problem_numbers, groups, comments, recorded_at = zip(*rows)
+        return AttemptLog.from_columns(
+            array('q', problem_numbers), array('b', groups), array('d', recorded_at),
+            {slot: comment for slot, comment in enumerate(comments) if comment}
+        )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()